@@ -8,306 +8,436 @@ import sys
 import struct
 import argparse
 import os
+import mmap
+import stat
+import shutil
+import tempfile
+import array
+import contextlib
+import concurrent.futures
 
-def convert_sll_to_eth(input_file, output_file):
-    """Convert Linux SLL PCAP to Ethernet PCAP"""
+# I/O buffer size; large buffers amortize syscalls on multi-GB captures
+_IO_BUFFER_SIZE = 1 << 20
+
+# Output buffers start small and double as the stream turns out
+# to be long, up to the amount of packet data collected before a write
+_STREAM_BUFFER_SIZE = 64 << 10
+_STREAM_FLUSH_SIZE = 4 << 20
+
+# Smallest capture for which streams are written by parallel worker processes
+_PARALLEL_MIN_SIZE = 32 << 20
+
+# Precompiled layouts for the fields parsed on every packet
+_PKT_HDR = struct.Struct('<IIII')      # ts_sec, ts_usec, incl_len, orig_len
+_RTP_SSRC = struct.Struct('>I')        # RTP SSRC
+_IP_FIXED = struct.Struct('>BBHHHBBH4s4s')  # IPv4 header without options
+_PKT_ETH_HDR = struct.Struct('<IIII14s')    # record header + Ethernet header
+
+# IPv4 version/IHL bytes with a valid header length (20 to 60 bytes)
+_VALID_VIHL = frozenset(range(0x45, 0x50))
+
+# Non-zero for first RTP header bytes carrying version 2
+_V2_MASK = bytes([((b >> 6) & 0x3) == 2 for b in range(256)])
+
+# Ethernet header put in front of every converted packet (14 bytes)
+# dst_mac(6) + src_mac(6) + ethertype(2), ethertype is IP (0x0800)
+_ETH_HEADER = b'\x00\x01\x02\x03\x04\x05' + b'\x00\x01\x02\x03\x04\x06' + b'\x08\x00'
+
+def _map_fd(fd):
+    """Map an open regular file read-only, it has to hold at least a PCAP global header"""
+    if os.fstat(fd).st_size < 24:
+        raise ValueError("Invalid PCAP file")
+    return mmap.mmap(fd, 0, access=mmap.ACCESS_READ)
+
+def _map_pcap(input_file):
+    """Map a PCAP file read-only and return a memoryview over its contents
+
+    Inputs that cannot be mapped (pipes, character devices) are copied
+    through a large read buffer into an unnamed temporary file, which is
+    mapped in their place and goes away with the mapping.
+    """
+    with open(input_file, 'rb', buffering=0) as raw:
+        if stat.S_ISREG(os.fstat(raw.fileno()).st_mode):
+            mm = _map_fd(raw.fileno())
+        else:
+            with tempfile.TemporaryFile(buffering=0) as tmp:
+                shutil.copyfileobj(raw, tmp, _IO_BUFFER_SIZE)
+                mm = _map_fd(tmp.fileno())
+    # Records are consumed front to back, let the kernel read ahead
+    if hasattr(mmap, 'MADV_SEQUENTIAL'):
+        mm.madvise(mmap.MADV_SEQUENTIAL)
+    # The mapping itself is unmapped once the last view over it goes away
+    return memoryview(mm)
+
+def _reserve(fout, buf, cur, size):
+    """Make room for size bytes at cur in an output buffer
+
+    The buffer is grown in place while below _STREAM_FLUSH_SIZE, past that
+    its contents are written to fout. Returns the cursor to store at.
+    """
+    if len(buf) < _STREAM_FLUSH_SIZE:
+        new_size = max(min(len(buf) * 2, _STREAM_FLUSH_SIZE), cur + size)
+        buf.extend(bytes(new_size - len(buf)))
+        return cur
+    fout.write(memoryview(buf)[:cur])
+    if size > len(buf):
+        buf.extend(bytes(size - len(buf)))
+    return 0
+
+@contextlib.contextmanager
+def _open_pcap(input_file):
+    """Open a PCAP file and return its global header and a record iterator
+
+    Regular files are mapped and walked with _iter_records(). Other inputs
+    (pipes, character devices) are read one record at a time through a
+    large read buffer by _read_records(), rather than copied aside by
+    _map_pcap(), as one-pass consumers never need to look back.
+    """
+    if stat.S_ISREG(os.stat(input_file).st_mode):
+        with _map_pcap(input_file) as mv:
+            yield mv[:24], _iter_records(mv)
+        return
+    
+    with open(input_file, 'rb', buffering=_IO_BUFFER_SIZE) as fin:
+        global_header = fin.read(24)
+        if len(global_header) != 24:
+            raise ValueError("Invalid PCAP file")
+        yield global_header, _read_records(fin)
+
+def _read_records(fin):
+    """Read the records of a PCAP stream positioned past its global header
+
+    Yields the same tuples as _iter_records(), buf being the packet data of
+    the record alone and pkt_off 0.
+    """
+    
+    while True:
+        # Read packet record header (16 bytes)
+        pkt_header = fin.read(16)
+        if len(pkt_header) != 16:
+            break  # End of file
+        ts_sec, ts_usec, incl_len, orig_len = _PKT_HDR.unpack(pkt_header)
+        
+        # Read packet data
+        packet_data = fin.read(incl_len)
+        if len(packet_data) != incl_len:
+            break
+        yield ts_sec, ts_usec, incl_len, orig_len, packet_data, 0
+
+def _iter_records(mv):
+    """Walk the records of a mapped PCAP file
+
+    Yields (ts_sec, ts_usec, incl_len, orig_len, buf, pkt_off) for every
+    complete record, pkt_off being the offset of the packet data in buf,
+    which is mv itself. A truncated trailing record ends the walk.
+    """
+    
+    pos = 24
+    end = len(mv)
+    
+    while end - pos >= 16:
+        # Parse packet record header (16 bytes)
+        ts_sec, ts_usec, incl_len, orig_len = _PKT_HDR.unpack_from(mv, pos)
+        pos += 16
+        
+        # Locate packet data
+        if end - pos < incl_len:
+            break
+        yield ts_sec, ts_usec, incl_len, orig_len, mv, pos
+        pos += incl_len
+
+def _parse_ipv4(mv, pkt_off, incl_len, link_hdr_len):
+    """Return the IPv4 header length of a record, 0 if it holds no valid IPv4 packet
+
+    The link-layer header is link_hdr_len bytes long and carries the
+    protocol / ethertype in its last two bytes (Linux SLL and Ethernet).
+    """
+    
+    ip_off = pkt_off + link_hdr_len
+    
+    # Only IP packets (protocol 0x0800) with room for an IP header
+    if (incl_len < link_hdr_len + 20 or mv[ip_off - 2] != 0x08 or
+            mv[ip_off - 1] != 0x00):
+        return 0
+    
+    # Common case, IPv4 without options
+    version_ihl = mv[ip_off]
+    if version_ihl == 0x45:
+        return 20
+    
+    # Only process IPv4 packets, version and minimum IHL in one lookup
+    if version_ihl not in _VALID_VIHL:
+        return 0
+    
+    # Calculate actual IP header length
+    ip_hdr_len = (version_ihl & 0x0F) << 2
+    if ip_hdr_len > incl_len - link_hdr_len:
+        return 0
+    return ip_hdr_len
+
+def _parse_rtp(mv, pkt_off, incl_len, link_hdr_len):
+    """Return (ip_hdr_len, ssrc) of a record carrying RTP over IPv4/UDP, None otherwise"""
+    
+    ip_hdr_len = _parse_ipv4(mv, pkt_off, incl_len, link_hdr_len)
+    if not ip_hdr_len:
+        return None
+    ip_off = pkt_off + link_hdr_len
+    
+    # Check if this is UDP
+    if mv[ip_off + 9] != 17:
+        return None
+    
+    # UDP ports, length and checksum are never looked at, only make sure
+    # the UDP header (8) and a minimum RTP header (12) are present
+    if incl_len - link_hdr_len < ip_hdr_len + 20:
+        return None
+    rtp_off = ip_off + ip_hdr_len + 8
+    
+    # Only process RTP version 2
+    if not _V2_MASK[mv[rtp_off]]:
+        return None
+    
+    # Extract SSRC (bytes 8-12 of RTP header)
+    return ip_hdr_len, _RTP_SSRC.unpack_from(mv, rtp_off + 8)[0]
+
+def _strip_ip_options(ip_data, ip_hdr_len, out_buf, out):
+    """Store an IPv4 packet with its header options removed into out_buf at out
+
+    For extractaudio compatibility the IP header has to be exactly 20 bytes,
+    so the essential fields are carried over into a new option-less header
+    followed by the original payload.
+    """
+    
+    (_, tos, total_length, identification, flags_fragment,
+     ttl, protocol_field, _, src_ip, dst_ip) = _IP_FIXED.unpack_from(ip_data)
+    
+    # Recalculate total length for new header
+    new_total_length = total_length - (ip_hdr_len - 20)
+    
+    # Store new IP header (20 bytes, no options)
+    _IP_FIXED.pack_into(out_buf, out,
+        0x45, tos, new_total_length,  # Version 4, IHL 5, TOS, Total Length
+        identification, flags_fragment,
+        ttl, protocol_field, 0,  # TTL, Protocol, Checksum (0)
+        src_ip, dst_ip
+    )
+    
+    # Copy payload after original IP header
+    payload_len = len(ip_data) - ip_hdr_len
+    out_buf[out + 20:out + 20 + payload_len] = ip_data[ip_hdr_len:]
+
+def _convert_kernel(records, fout):
+    """Rewrite SLL records as Ethernet records and write them to fout
+
+    records yields the tuples of _iter_records() / _read_records().
+    Converted records are assembled in a bounded output
+    buffer that is written out whenever it fills up (see _reserve()).
+    Returns the packet count.
+    """
     
-    # Ethernet header template (14 bytes)
-    # dst_mac(6) + src_mac(6) + ethertype(2)
     ETH_HEADER_SIZE = 14
     SLL_HEADER_SIZE = 16
     
-    with open(input_file, 'rb') as fin, open(output_file, 'wb') as fout:
+    out_buf = bytearray(_STREAM_BUFFER_SIZE)
+    out = 0
+    packet_count = 0
+    
+    for ts_sec, ts_usec, incl_len, orig_len, in_buf, pkt_off in records:
+        # Only IPv4 packets are converted, extractaudio only needs IP/UDP/RTP
+        # so everything else is skipped
+        ip_hdr_len = _parse_ipv4(in_buf, pkt_off, incl_len, SLL_HEADER_SIZE)
+        if not ip_hdr_len:
+            continue
+        
+        # IP data starts after SLL header
+        ip_off = pkt_off + SLL_HEADER_SIZE
+        ip_end = pkt_off + incl_len
+        ip_len = incl_len - SLL_HEADER_SIZE
+        
+        # Standardized packet: Ethernet header, 20-byte IP header, IP payload
+        new_incl_len = ETH_HEADER_SIZE + 20 + ip_len - ip_hdr_len
+        new_orig_len = orig_len - SLL_HEADER_SIZE + ETH_HEADER_SIZE - (ip_hdr_len - 20)
+        
+        if out + 16 + new_incl_len > len(out_buf):
+            out = _reserve(fout, out_buf, out, 16 + new_incl_len)
+        
+        # Store new packet header and Ethernet header
+        _PKT_ETH_HDR.pack_into(out_buf, out, ts_sec, ts_usec, new_incl_len, new_orig_len, _ETH_HEADER)
+        ip_out = out + 16 + ETH_HEADER_SIZE
+        out += 16 + new_incl_len
+        
+        # Common case, no IP options: the IP data is copied untouched
+        if ip_hdr_len == 20:
+            out_buf[ip_out:ip_out + ip_len] = in_buf[ip_off:ip_end]
+        else:
+            # Slow path, the IP header carries options
+            _strip_ip_options(in_buf[ip_off:ip_end], ip_hdr_len, out_buf, ip_out)
+        
+        packet_count += 1
+    
+    fout.write(memoryview(out_buf)[:out])
+    return packet_count
+
+def convert_sll_to_eth(input_file, output_file):
+    """Convert Linux SLL PCAP to Ethernet PCAP"""
+    
+    with _open_pcap(input_file) as (global_header, records), \
+            open(output_file, 'wb', buffering=_IO_BUFFER_SIZE) as fout:
         # Copy PCAP global header (24 bytes)
-        global_header = fin.read(24)
-        if len(global_header) != 24:
-            raise ValueError("Invalid PCAP file")
+        header_data = bytearray(global_header)
         
         # Modify network type in global header from Linux SLL (113) to Ethernet (1)
-        header_data = bytearray(global_header)
-        header_data[20:24] = struct.pack('<I', 1)  # DLT_EN10MB = 1
+        struct.pack_into('<I', header_data, 20, 1)  # DLT_EN10MB = 1
         fout.write(header_data)
         
-        packet_count = 0
+        packet_count = _convert_kernel(records, fout)
+        
+        print(f"Converted {packet_count} packets from Linux SLL to Ethernet format")
+        return packet_count
+
+def _write_stream(mv, filename, global_header, offsets):
+    """Write the RTP packets of one stream into its own Ethernet PCAP file
+
+    offsets holds the packet data offset in mv of every record of the
+    stream, as collected by the first pass of split_rtp_streams().
+    """
+    
+    ETH_HEADER_SIZE = 14
+    SLL_HEADER_SIZE = 16
+    
+    # Records are serialized into a preallocated buffer at a write cursor
+    buf = bytearray(_STREAM_BUFFER_SIZE)
+    cur = 0
+    
+    with open(filename, 'wb', buffering=_IO_BUFFER_SIZE) as fout:
+        fout.write(global_header)
         
-        while True:
-            # Read packet record header (16 bytes)
-            pkt_header = fin.read(16)
-            if len(pkt_header) != 16:
-                break  # End of file
-                
-            # Parse packet header
-            ts_sec, ts_usec, incl_len, orig_len = struct.unpack('<IIII', pkt_header)
+        for pkt_off in offsets:
+            ts_sec, ts_usec, incl_len, orig_len = _PKT_HDR.unpack_from(mv, pkt_off - 16)
+            
+            # IP data starts after SLL header, it was validated by the first pass
+            ip_data = mv[pkt_off + SLL_HEADER_SIZE:pkt_off + incl_len]
+            ip_hdr_len = (ip_data[0] & 0x0F) << 2
             
-            # Read packet data
-            packet_data = fin.read(incl_len)
-            if len(packet_data) != incl_len:
-                break
-                
-            # Check if this is a Linux SLL packet with IP protocol
-            if incl_len >= SLL_HEADER_SIZE:
-                # Parse Linux SLL header
-                sll_data = packet_data[:SLL_HEADER_SIZE]
-                packet_type, device_type, addr_len = struct.unpack('>HHH', sll_data[:6])
-                address = sll_data[6:14]  # 8 bytes
-                protocol = struct.unpack('>H', sll_data[14:16])[0]
-                
-                # Only convert IP packets (protocol 0x0800)
-                if protocol == 0x0800 and incl_len > SLL_HEADER_SIZE:
-                    # IP data starts after SLL header
-                    ip_data = packet_data[SLL_HEADER_SIZE:]
-                    
-                    # Verify this is a valid IP packet with minimum length
-                    if len(ip_data) < 20:  # Minimum IP header length
-                        continue
-                        
-                    # Parse IP header to ensure it's valid
-                    ip_header = ip_data[:20]
-                    version_ihl = ip_header[0]
-                    version = (version_ihl >> 4) & 0xF
-                    ihl = version_ihl & 0xF
-                    
-                    # Only process IPv4 packets
-                    if version != 4:
-                        continue
-                        
-                    # Calculate actual IP header length
-                    ip_hdr_len = ihl * 4
-                    if ip_hdr_len < 20 or ip_hdr_len > len(ip_data):
-                        continue
-                        
-                    # For extractaudio compatibility, we need to ensure the IP header is exactly 20 bytes
-                    # If it has options, we'll create a new header without them
-                    if ip_hdr_len != 20:
-                        # Extract essential fields and create a new 20-byte header
-                        version_ihl_new = 0x45  # Version 4, IHL 5 (20 bytes)
-                        tos = ip_header[1]
-                        total_length = struct.unpack('>H', ip_header[2:4])[0]
-                        identification = ip_header[4:6]
-                        flags_fragment = ip_header[6:8]
-                        ttl = ip_header[8]
-                        protocol_field = ip_header[9]
-                        src_ip = ip_header[12:16]
-                        dst_ip = ip_header[16:20]
-                        
-                        # Recalculate total length for new header
-                        new_total_length = total_length - (ip_hdr_len - 20)
-                        
-                        # Create new IP header (20 bytes, no options)
-                        new_ip_header = struct.pack('>BBHHHBBH4s4s',
-                            version_ihl_new, tos, new_total_length,
-                            struct.unpack('>H', identification)[0],
-                            struct.unpack('>H', flags_fragment)[0],
-                            ttl, protocol_field, 0,  # checksum will be 0
-                            src_ip, dst_ip
-                        )
-                        
-                        # Get payload after original IP header
-                        payload = ip_data[ip_hdr_len:]
-                        ip_data = new_ip_header + payload
-                    
-                    # Create Ethernet header
-                    dst_mac = b'\x00\x01\x02\x03\x04\x05'
-                    src_mac = b'\x00\x01\x02\x03\x04\x06'
-                    ethertype = struct.pack('>H', 0x0800)  # IP
-                    
-                    eth_header = dst_mac + src_mac + ethertype
-                    
-                    # Create new packet
-                    new_packet = eth_header + ip_data
-                    new_incl_len = len(new_packet)
-                    new_orig_len = orig_len - SLL_HEADER_SIZE + ETH_HEADER_SIZE - (ip_hdr_len - 20) if ip_hdr_len != 20 else orig_len - SLL_HEADER_SIZE + ETH_HEADER_SIZE
-                    
-                    # Write new packet header
-                    new_pkt_header = struct.pack('<IIII', ts_sec, ts_usec, new_incl_len, new_orig_len)
-                    fout.write(new_pkt_header)
-                    fout.write(new_packet)
-                    
-                    packet_count += 1
-                    continue
+            # Standardized packet: Ethernet header, 20-byte IP header, IP payload
+            ip_len = len(ip_data)
+            new_incl_len = ETH_HEADER_SIZE + 20 + ip_len - ip_hdr_len
+            new_orig_len = orig_len - SLL_HEADER_SIZE + ETH_HEADER_SIZE - (ip_hdr_len - 20)
             
-            # For non-IP packets or invalid packets, skip them
-            # (or you could write them as-is, but extractaudio only needs IP/UDP/RTP)
+            if cur + 16 + new_incl_len > len(buf):
+                cur = _reserve(fout, buf, cur, 16 + new_incl_len)
+            
+            # Store packet header and Ethernet header
+            _PKT_ETH_HDR.pack_into(buf, cur, ts_sec, ts_usec, new_incl_len, new_orig_len, _ETH_HEADER)
+            ip_out = cur + 16 + ETH_HEADER_SIZE
+            cur += 16 + new_incl_len
+            
+            # Common case, no IP options: the IP data goes out untouched
+            if ip_hdr_len == 20:
+                buf[ip_out:ip_out + ip_len] = ip_data
+            else:
+                # Slow path, the IP header carries options
+                _strip_ip_options(ip_data, ip_hdr_len, buf, ip_out)
         
-        print(f"Converted {packet_count} packets from Linux SLL to Ethernet format")
-        return packet_count
+        fout.write(memoryview(buf)[:cur])
+
+def _revisit(mv):
+    """Keep the pages of a mapping cached for a second pass over it
+
+    _map_pcap() advises sequential access, under which the kernel may drop
+    pages once read; the second pass of split_rtp_streams() walks the
+    mapping once per stream.
+    """
+    if hasattr(mmap, 'MADV_NORMAL'):
+        mv.obj.madvise(mmap.MADV_NORMAL)
+
+def _write_stream_file(input_file, filename, global_header, offsets):
+    """Worker process entry point of _write_stream(), maps input_file on its own"""
+    with _map_pcap(input_file) as mv:
+        _revisit(mv)
+        _write_stream(mv, filename, global_header, offsets)
+
+def _usable_cpus():
+    """Return the number of CPUs this process may run on"""
+    # Honours the affinity mask of the container, os.cpu_count() does not
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
 
 def split_rtp_streams(input_file, output_prefix):
     """Split RTP streams by SSRC into separate PCAP files"""
     
-    # Ethernet header template (14 bytes)
-    ETH_HEADER_SIZE = 14
     SLL_HEADER_SIZE = 16
     
-    stream_files = {}
-    stream_counts = {}
+    # Packet data offsets of every RTP packet, keyed by the integer SSRC
+    stream_offsets = {}
+    streams = []
     
-    # Global PCAP header for output files
-    global_header = None
-    
-    with open(input_file, 'rb') as fin:
+    with _map_pcap(input_file) as mv:
         # Read and store PCAP global header (24 bytes)
-        global_header = fin.read(24)
-        if len(global_header) != 24:
-            raise ValueError("Invalid PCAP file")
+        global_header = bytearray(mv[:24])
         
         # Modify network type to Ethernet (DLT_EN10MB = 1)
-        global_header = bytearray(global_header)
-        global_header[20:24] = struct.pack('<I', 1)  # DLT_EN10MB = 1
-        global_header = bytes(global_header)
+        struct.pack_into('<I', global_header, 20, 1)  # DLT_EN10MB = 1
         
-        while True:
-            # Read packet record header (16 bytes)
-            pkt_header = fin.read(16)
-            if len(pkt_header) != 16:
-                break  # End of file
-                
-            # Parse packet header
-            ts_sec, ts_usec, incl_len, orig_len = struct.unpack('<IIII', pkt_header)
-            
-            # Read packet data
-            packet_data = fin.read(incl_len)
-            if len(packet_data) != incl_len:
-                break
-                
-            # Check if this is a Linux SLL packet with IP protocol
-            if incl_len >= SLL_HEADER_SIZE:
-                # Parse Linux SLL header
-                sll_data = packet_data[:SLL_HEADER_SIZE]
-                protocol = struct.unpack('>H', sll_data[14:16])[0]
-                
-                # Only process IP packets (protocol 0x0800)
-                if protocol == 0x0800 and incl_len > SLL_HEADER_SIZE:
-                    # IP data starts after SLL header
-                    ip_data = packet_data[SLL_HEADER_SIZE:]
-                    
-                    # Verify this is a valid IP packet
-                    if len(ip_data) < 20:
-                        continue
-                        
-                    # Parse IP header
-                    ip_header = ip_data[:20]
-                    version_ihl = ip_header[0]
-                    version = (version_ihl >> 4) & 0xF
-                    ihl = version_ihl & 0xF
-                    
-                    # Only process IPv4 packets
-                    if version != 4:
-                        continue
-                        
-                    # Calculate IP header length
-                    ip_hdr_len = ihl * 4
-                    if ip_hdr_len < 20 or ip_hdr_len > len(ip_data):
-                        continue
-                    
-                    # Check if this is UDP
-                    protocol_field = ip_header[9]
-                    if protocol_field != 17:  # UDP
-                        continue
-                    
-                    # Get UDP header
-                    if len(ip_data) < ip_hdr_len + 8:  # IP header + UDP header
-                        continue
-                        
-                    udp_header = ip_data[ip_hdr_len:ip_hdr_len + 8]
-                    src_port, dst_port, udp_len, udp_checksum = struct.unpack('>HHHH', udp_header)
-                    
-                    # Get RTP payload
-                    rtp_data = ip_data[ip_hdr_len + 8:]
-                    if len(rtp_data) < 12:  # Minimum RTP header
-                        continue
-                    
-                    # Parse RTP header to get SSRC
-                    rtp_header = rtp_data[:12]
-                    version_byte = rtp_header[0]
-                    rtp_version = (version_byte >> 6) & 0x3
-                    
-                    # Only process RTP version 2
-                    if rtp_version != 2:
-                        continue
-                    
-                    # Extract SSRC (bytes 8-12 of RTP header)
-                    ssrc = struct.unpack('>I', rtp_header[8:12])[0]
-                    ssrc_hex = f"0x{ssrc:08x}"
-                    
-                    # Create Ethernet packet with standardized 20-byte IP header
-                    if ip_hdr_len != 20:
-                        # Extract essential fields and create new 20-byte header
-                        tos = ip_header[1]
-                        total_length = struct.unpack('>H', ip_header[2:4])[0]
-                        identification = ip_header[4:6]
-                        flags_fragment = ip_header[6:8]
-                        ttl = ip_header[8]
-                        src_ip = ip_header[12:16]
-                        dst_ip = ip_header[16:20]
-                        
-                        # Recalculate total length for new header
-                        new_total_length = total_length - (ip_hdr_len - 20)
-                        
-                        # Create new IP header (20 bytes, no options)
-                        new_ip_header = struct.pack('>BBHHHBBH4s4s',
-                            0x45, tos, new_total_length,  # Version 4, IHL 5, TOS, Total Length
-                            struct.unpack('>H', identification)[0],
-                            struct.unpack('>H', flags_fragment)[0],
-                            ttl, protocol_field, 0,  # TTL, Protocol, Checksum (0)
-                            src_ip, dst_ip
-                        )
-                        
-                        # Get payload after original IP header
-                        payload = ip_data[ip_hdr_len:]
-                        ip_data = new_ip_header + payload
-                    
-                    # Create Ethernet header
-                    dst_mac = b'\x00\x01\x02\x03\x04\x05'
-                    src_mac = b'\x00\x01\x02\x03\x04\x06'
-                    ethertype = struct.pack('>H', 0x0800)  # IP
-                    
-                    eth_header = dst_mac + src_mac + ethertype
-                    
-                    # Create new packet
-                    new_packet = eth_header + ip_data
-                    new_incl_len = len(new_packet)
-                    new_orig_len = orig_len - SLL_HEADER_SIZE + ETH_HEADER_SIZE - (ip_hdr_len - 20) if ip_hdr_len != 20 else orig_len - SLL_HEADER_SIZE + ETH_HEADER_SIZE
-                    
-                    # Open output file for this SSRC if not already open
-                    if ssrc_hex not in stream_files:
-                        filename = f"{output_prefix}_{ssrc_hex}.pcap"
-                        stream_files[ssrc_hex] = open(filename, 'wb')
-                        stream_files[ssrc_hex].write(global_header)
-                        stream_counts[ssrc_hex] = 0
-                        print(f"Created stream file: {filename} for SSRC {ssrc_hex}")
-                    
-                    # Write packet to appropriate stream file
-                    new_pkt_header = struct.pack('<IIII', ts_sec, ts_usec, new_incl_len, new_orig_len)
-                    stream_files[ssrc_hex].write(new_pkt_header)
-                    stream_files[ssrc_hex].write(new_packet)
-                    stream_counts[ssrc_hex] += 1
-
-    # Close all output files
-    for ssrc_hex, file_handle in stream_files.items():
-        file_handle.close()
-        print(f"Stream {ssrc_hex}: {stream_counts[ssrc_hex]} packets written")
-    
-    return list(stream_files.keys())
+        # First pass: locate the RTP packets and group them by SSRC
+        for ts_sec, ts_usec, incl_len, orig_len, _, pkt_off in _iter_records(mv):
+            rtp = _parse_rtp(mv, pkt_off, incl_len, SLL_HEADER_SIZE)
+            if rtp is None:
+                continue
+            ssrc = rtp[1]
+            offsets = stream_offsets.get(ssrc)
+            if offsets is None:
+                offsets = stream_offsets[ssrc] = array.array('Q')
+            offsets.append(pkt_off)
+        
+        for ssrc, offsets in stream_offsets.items():
+            ssrc_hex = f"0x{ssrc:08x}"
+            filename = f"{output_prefix}_{ssrc_hex}.pcap"
+            streams.append((ssrc_hex, filename, offsets))
+            print(f"Created stream file: {filename} for SSRC {ssrc_hex}")
+        
+        # Second pass: streams are independent, so on large captures they are
+        # written by worker processes, each mapping the input on its own.
+        # Pipes cannot be reopened by the workers, their temporary copy is
+        # only reachable through mv
+        workers = min(len(streams), _usable_cpus())
+        if (workers > 1 and len(mv) >= _PARALLEL_MIN_SIZE and
+                stat.S_ISREG(os.stat(input_file).st_mode)):
+            with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = [executor.submit(_write_stream_file, input_file, filename, global_header, offsets)
+                           for ssrc_hex, filename, offsets in streams]
+                for future in futures:
+                    future.result()
+        else:
+            _revisit(mv)
+            for ssrc_hex, filename, offsets in streams:
+                _write_stream(mv, filename, global_header, offsets)
+    
+    ssrcs = []
+    for ssrc_hex, filename, offsets in streams:
+        print(f"Stream {ssrc_hex}: {len(offsets)} packets written")
+        ssrcs.append(ssrc_hex)
+    
+    return ssrcs
 
 def analyze_pcap(input_file):
     """Analyze PCAP file and show information about RTP streams"""
     
     SLL_HEADER_SIZE = 16
     ETH_HEADER_SIZE = 14
-    stream_info = {}
+    # Per-stream statistics as parallel tables keyed by the integer SSRC,
+    # timestamps are kept as integer microseconds
+    stream_packets = {}
+    stream_first_ts = {}
+    stream_last_ts = {}
     total_packets = 0
     rtp_packets = 0
     is_sll_format = False
     
-    with open(input_file, 'rb') as fin:
-        # Read PCAP global header
-        global_header = fin.read(24)
-        if len(global_header) != 24:
-            raise ValueError("Invalid PCAP file")
-        
-        # Check link layer type
-        linktype = struct.unpack('<I', global_header[20:24])[0]
+    with _open_pcap(input_file) as (global_header, records):
+        # Check link layer type in the PCAP global header
+        linktype = struct.unpack_from('<I', global_header, 20)[0]
         if linktype == 113:  # DLT_LINUX_SLL
             is_sll_format = True
             print("PCAP format: Linux SLL (cooked capture)")
@@ -316,92 +446,36 @@ def analyze_pcap(input_file):
         else:
             print(f"PCAP format: Unknown (linktype={linktype})")
         
-        while True:
-            # Read packet record header
-            pkt_header = fin.read(16)
-            if len(pkt_header) != 16:
-                break
-                
-            ts_sec, ts_usec, incl_len, orig_len = struct.unpack('<IIII', pkt_header)
-            packet_data = fin.read(incl_len)
-            if len(packet_data) != incl_len:
-                break
-            
+        # Link header preceding the IP header in every record
+        link_hdr_len = SLL_HEADER_SIZE if is_sll_format else ETH_HEADER_SIZE
+        
+        for ts_sec, ts_usec, incl_len, orig_len, buf, pkt_off in records:
             total_packets += 1
             
-            # Parse based on format
-            if is_sll_format and incl_len >= SLL_HEADER_SIZE:
-                sll_data = packet_data[:SLL_HEADER_SIZE]
-                protocol = struct.unpack('>H', sll_data[14:16])[0]
-                if protocol == 0x0800:  # IP
-                    ip_data = packet_data[SLL_HEADER_SIZE:]
-                else:
-                    continue
-            elif not is_sll_format and incl_len >= ETH_HEADER_SIZE:
-                eth_header = packet_data[:ETH_HEADER_SIZE]
-                ethertype = struct.unpack('>H', eth_header[12:14])[0]
-                if ethertype == 0x0800:  # IP
-                    ip_data = packet_data[ETH_HEADER_SIZE:]
-                else:
-                    continue
-            else:
-                continue
-            
-            # Parse IP header
-            if len(ip_data) < 20:
-                continue
-                
-            ip_header = ip_data[:20]
-            version_ihl = ip_header[0]
-            version = (version_ihl >> 4) & 0xF
-            ihl = version_ihl & 0xF
-            
-            if version != 4:
-                continue
-                
-            ip_hdr_len = ihl * 4
-            if ip_hdr_len < 20 or ip_hdr_len > len(ip_data):
-                continue
-            
-            protocol_field = ip_header[9]
-            if protocol_field != 17:  # UDP
-                continue
-            
-            # Parse UDP header
-            if len(ip_data) < ip_hdr_len + 8:
-                continue
-                
-            udp_header = ip_data[ip_hdr_len:ip_hdr_len + 8]
-            src_port, dst_port, udp_len, udp_checksum = struct.unpack('>HHHH', udp_header)
-            
-            # Get RTP data
-            rtp_data = ip_data[ip_hdr_len + 8:]
-            if len(rtp_data) < 12:
-                continue
-            
-            # Parse RTP header
-            rtp_header = rtp_data[:12]
-            version_byte = rtp_header[0]
-            rtp_version = (version_byte >> 6) & 0x3
-            
-            if rtp_version != 2:
+            rtp = _parse_rtp(buf, pkt_off, incl_len, link_hdr_len)
+            if rtp is None:
                 continue
             
             rtp_packets += 1
             
-            # Extract SSRC
-            ssrc = struct.unpack('>I', rtp_header[8:12])[0]
-            ssrc_hex = f"0x{ssrc:08x}"
+            ssrc = rtp[1]
+            ts_us = ts_sec * 1000000 + ts_usec
             
-            if ssrc_hex not in stream_info:
-                stream_info[ssrc_hex] = {
-                    'packets': 0,
-                    'first_timestamp': ts_sec + ts_usec / 1000000,
-                    'last_timestamp': ts_sec + ts_usec / 1000000
-                }
-            
-            stream_info[ssrc_hex]['packets'] += 1
-            stream_info[ssrc_hex]['last_timestamp'] = ts_sec + ts_usec / 1000000
+            if ssrc in stream_packets:
+                stream_packets[ssrc] += 1
+            else:
+                stream_packets[ssrc] = 1
+                stream_first_ts[ssrc] = ts_us
+            stream_last_ts[ssrc] = ts_us
+    
+    stream_info = {
+        f"0x{ssrc:08x}": {
+            'packets': packets,
+            'first_timestamp': stream_first_ts[ssrc] / 1000000,
+            'last_timestamp': stream_last_ts[ssrc] / 1000000
+        }
+        for ssrc, packets in stream_packets.items()
+    }
     
     # Print analysis results
     print(f"Total packets: {total_packets}")
@@ -410,9 +484,10 @@ def analyze_pcap(input_file):
     
     if stream_info:
         print("\nRTP Stream Details:")
-        for ssrc, info in sorted(stream_info.items(), key=lambda x: x[1]['packets'], reverse=True):
-            duration = info['last_timestamp'] - info['first_timestamp']
-            print(f"  SSRC {ssrc}: {info['packets']} packets, duration: {duration:.2f}s")
+        for ssrc, packets in sorted(stream_packets.items(), key=lambda x: x[1], reverse=True):
+            # Converted to seconds only here, from the exact integer difference
+            duration = (stream_last_ts[ssrc] - stream_first_ts[ssrc]) / 1000000
+            print(f"  SSRC 0x{ssrc:08x}: {packets} packets, duration: {duration:.2f}s")
     
     return stream_info
 